@@ -1,8 +1,8 @@
-import simpy
-import random
-import math
 import matplotlib.pyplot as plt
 import argparse
+import sys
+import yaml
+from sim_core import run_sim, downsample_lttb, sweep_params, run_sweep
 
 # --------------------------
 # Parse command-line arguments
@@ -13,101 +13,95 @@ parser.add_argument("--clinicians", type=int, default=4, help="Number of clinici
 parser.add_argument("--patients_per_clinician_per_week", type=int, default=5, help="Patients each clinician can see per week (default: 5)")
 parser.add_argument("--duration_years", type=int, default=3, help="Simulation duration in years (default: 3)")
 parser.add_argument("--initial_waitlist", type=int, default=0, help="Initial waiting list length (default: 0)")
-
-args = parser.parse_args()
-
-# --------------------------
-# Assign from arguments
-# --------------------------
-patients = args.patients
-clinicians = args.clinicians
-patients_per_clinician_per_week = args.patients_per_clinician_per_week
-sim_duration_years = args.duration_years
-waiting_list_start_length = args.initial_waitlist
-
-# --------------------------
-# Tracking variables
-# --------------------------
-waiting_times = []
-queue_lengths = []
-time_points = []
-patients_seen = []
-all_patients = []
-
-random.seed(42)
-
-# --------------------------
-# Simulation functions
-# --------------------------
-def patient(env, name, nurses, arrival_time):
-    service_time = 1 / patients_per_clinician_per_week
-    patient_record = {
-        'name': name,
-        'arrival_time': arrival_time,
-        'service_start': None,
-        'wait_time_weeks': None,
-        'status': 'waiting'
-    }
-    all_patients.append(patient_record)
-
-    with nurses.request() as request:
-        yield request
-        wait_time = env.now - arrival_time
-        waiting_times.append(wait_time)
-
-        patient_record['service_start'] = env.now
-        patient_record['wait_time_weeks'] = wait_time
-        patient_record['status'] = 'seen'
-
-        patients_seen.append(patient_record.copy())
-        yield env.timeout(service_time)
-
-def patient_generator(env, nurses):
-    for i in range(waiting_list_start_length):
-        env.process(patient(env, f"Initial Patient {i+1}", nurses, 0))
-
-    while True:
-        num_arrivals = math.ceil(random.normalvariate(patients, patients * 0.2))
-        num_arrivals = max(0, num_arrivals)
-        for i in range(num_arrivals):
-            env.process(patient(env, f"Week {math.ceil(env.now)} Patient {i+1}", nurses, env.now))
-        yield env.timeout(1)
-
-def monitor_queue(env, nurses):
-    while True:
-        queue_lengths.append(len(nurses.queue))
-        time_points.append(env.now)
-        yield env.timeout(1)
-
-# --------------------------
-# Run simulation
-# --------------------------
-env = simpy.Environment()
-nurses_resource = simpy.Resource(env, capacity=clinicians)
-env.process(patient_generator(env, nurses_resource))
-env.process(monitor_queue(env, nurses_resource))
-env.run(until=sim_duration_years * 52)
-
-# --------------------------
-# Plot results
-# --------------------------
-plt.figure(figsize=(10, 4))
-plt.plot(time_points, queue_lengths, linewidth=2, color='#1f77b4')
-plt.xlabel('Time (weeks)')
-plt.ylabel('Waiting List Length')
-plt.title('Waiting List Length Over Time')
-plt.grid(True, alpha=0.3)
-plt.tight_layout()
-plt.show()
-
-# --------------------------
-# Print summary
-# --------------------------
-final_waiting_list = len(nurses_resource.queue)
-patients_seen_count = len(patients_seen)
-avg_wait = sum(waiting_times) / len(waiting_times) if waiting_times else 0
-
-print("\n--- Simulation Summary ---")
-print(f"Final Waiting List: {final_waiting_list}")
-print(f"Patients Seen: {patients_seen_count}")
-print(f"Average Wait (weeks): {avg_wait:.1f}")
+parser.add_argument("--sweep", help="YAML file of parameter lists to sweep over in parallel, instead of a single run")
+parser.add_argument("--replications", type=int, default=1, help="Replications of each parameter combination in a sweep (default: 1)")
+parser.add_argument("--output", default="results.feather", help="Where to write sweep results (default: results.feather)")
+
+# Sweep worker processes may re-import this file, so only run when executed as a script
+if __name__ == "__main__":
+    args = parser.parse_args()
+
+    # --------------------------
+    # Parameter sweep
+    # --------------------------
+    if args.sweep:
+        with open(args.sweep) as f:
+            # An empty file loads as None - treat it as nothing to sweep
+            sweep = yaml.safe_load(f) or {}
+
+        # Any parameter not listed in the YAML uses its command-line value
+        base_params = {
+            "patients": args.patients,
+            "clinicians": args.clinicians,
+            "patients_per_clinician_per_week": args.patients_per_clinician_per_week,
+            "duration_years": args.duration_years,
+            "initial_waitlist": args.initial_waitlist,
+            "arrival_spread": 0.2,
+            "seed": 42
+        }
+
+        # Catch bad input before starting any workers - an unknown key would otherwise
+        # be swept over without affecting the simulation
+        if args.replications < 1:
+            parser.error("--replications must be at least 1")
+        if not isinstance(sweep, dict):
+            parser.error(f"{args.sweep} should map parameter names to values")
+        unknown_params = sorted(set(sweep) - set(base_params))
+        if unknown_params:
+            parser.error(
+                f"unknown parameter(s) in {args.sweep}: {', '.join(map(str, unknown_params))} "
+                f"(expected some of: {', '.join(base_params)})"
+            )
+
+        results = run_sweep(sweep_params(base_params, sweep, args.replications))
+        results.to_feather(args.output)
+        print(f"Ran {len(results)} simulations - results written to {args.output}")
+        sys.exit()
+
+    # --------------------------
+    # Assign from arguments
+    # --------------------------
+    patients = args.patients
+    clinicians = args.clinicians
+    patients_per_clinician_per_week = args.patients_per_clinician_per_week
+    sim_duration_years = args.duration_years
+    waiting_list_start_length = args.initial_waitlist
+
+    # --------------------------
+    # Run simulation
+    # --------------------------
+    time_points, queue_lengths, waiting_times, still_waiting = run_sim(
+        weeks=sim_duration_years * 52,
+        capacity=clinicians * patients_per_clinician_per_week,
+        mean_arrivals=patients,
+        sigma=patients * 0.2,
+        seed=42,
+        initial=waiting_list_start_length
+    )
+
+    # --------------------------
+    # Plot results
+    # --------------------------
+    # Fixed axes position rather than tight_layout, so there's no layout pass on draw
+    fig = plt.figure(figsize=(10, 4))
+    ax = fig.add_axes([0.08, 0.14, 0.9, 0.78])
+    # No point drawing more than two points per pixel of figure width
+    n_out = int(2 * fig.get_figwidth() * fig.dpi)
+    ax.plot(*downsample_lttb(time_points, queue_lengths, n_out), linewidth=2, color='#1f77b4')
+    ax.set_xlabel('Time (weeks)')
+    ax.set_ylabel('Waiting List Length')
+    ax.set_title('Waiting List Length Over Time')
+    ax.grid(True, alpha=0.3)
+    plt.show()
+
+    # --------------------------
+    # Print summary
+    # --------------------------
+    final_waiting_list = len(still_waiting)
+    patients_seen_count = len(waiting_times)
+    avg_wait = waiting_times.mean() if len(waiting_times) else 0
+
+    print("\n--- Simulation Summary ---")
+    print(f"Final Waiting List: {final_waiting_list}")
+    print(f"Patients Seen: {patients_seen_count}")
+    print(f"Average Wait (weeks): {avg_wait:.1f}")
@@ -0,0 +1,154 @@
+"""Weekly-tick waiting list simulation shared by the command line and Streamlit examples.
+
+The SimPy version shown in the slides only ever moves time on in whole weeks and
+sees a fixed number of patients per week, so here it's written directly as a
+weekly balance of arrivals and capacity - no event queue, processes or resources.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from numba import njit
+
+
+def weekly_arrivals(rng, weeks, mean_arrivals, sigma):
+    """Draw every week's arrivals in one go, rounded up and floored at zero."""
+    return np.ceil(rng.normal(mean_arrivals, sigma, size=weeks)).clip(min=0).astype(np.int64)
+
+
+def downsample_lttb(x, y, n_out):
+    """Reduce a line to n_out points with Largest-Triangle-Three-Buckets, keeping its shape."""
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    # First and last points are always kept; the rest are split into n_out - 2 buckets
+    edges = np.append(np.linspace(1, n - 1, n_out - 1).astype(np.int64), n)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    for i in range(n_out - 2):
+        start, end, next_end = edges[i], edges[i + 1], edges[i + 2]
+        ax, ay = x[keep[i]], y[keep[i]]
+        cx, cy = x[end:next_end].mean(), y[end:next_end].mean()
+
+        # Keep the point forming the largest triangle with the last kept point and the next bucket's average
+        area = np.abs((ax - cx) * (y[start:end] - ay) - (ax - x[start:end]) * (cy - ay))
+        keep[i + 1] = start + np.argmax(area)
+
+    return x[keep], y[keep]
+
+
+@njit(cache=True)
+def queue_series(arrivals, capacity, initial):
+    """Waiting list length at the end of each week.
+
+    Each week the list grows by that week's arrivals and shrinks by up to
+    `capacity`, so this is a running balance starting from `initial`.
+    """
+    queue_lengths = np.empty(len(arrivals), dtype=np.int64)
+    queue = initial
+
+    for week in range(len(arrivals)):
+        queue = max(0, queue + arrivals[week] - capacity)
+        queue_lengths[week] = queue
+
+    return queue_lengths
+
+
+def run_sim(weeks, capacity, mean_arrivals, sigma, seed, initial=0):
+    """Simulate the waiting list week by week, seeing up to `capacity` patients a week.
+
+    `seed` is anything np.random.default_rng accepts, e.g. an int or a SeedSequence.
+
+    Returns the week numbers, the waiting list length at the end of each week,
+    the waits (in weeks) of patients who were seen, and the arrival weeks of
+    patients still waiting at the end.
+    """
+    # No weeks simulated: nobody arrives or is seen, and the initial list is still waiting
+    if weeks == 0:
+        no_weeks = np.zeros(0, dtype=np.int64)
+        return no_weeks, no_weeks, no_weeks, np.zeros(initial, dtype=np.int64)
+
+    rng = np.random.default_rng(seed)
+    arrivals = weekly_arrivals(rng, weeks, mean_arrivals, sigma)
+
+    # Patient records held column-wise, indexed by patient id in arrival order.
+    # The initial waiting list counts as arriving in week 0, so one repeat builds
+    # the whole column without a separate concatenate copy
+    arrivals_by_week = arrivals.copy()
+    arrivals_by_week[0] += initial
+    arrival_week = np.repeat(np.arange(weeks), arrivals_by_week)
+    queue_lengths = queue_series(arrivals, capacity, initial)
+
+    # Anyone who has arrived and isn't on the list has been seen. Patients are seen
+    # in arrival order, so patient id p is seen in the first week by the end of
+    # which more than p patients have been seen in total
+    seen_by_week = initial + np.cumsum(arrivals) - queue_lengths
+    n_seen = seen_by_week[-1]
+    service_week = np.searchsorted(seen_by_week, np.arange(n_seen), side='right')
+
+    time_points = np.arange(weeks)
+    waits = service_week - arrival_week[:n_seen]
+
+    # Everyone from id n_seen onwards is still waiting, so this is a view of the
+    # queue itself rather than a scan over every patient who arrived
+    still_waiting = arrival_week[n_seen:]
+    return time_points, queue_lengths, waits, still_waiting
+
+
+def run_one(params):
+    """Run the simulation for one parameter set and summarise it as a flat dict."""
+    # Same independent stream as SeedSequence(seed).spawn(n)[replication], rebuilt
+    # here so only plain numbers need sending to (and back from) the worker
+    seed = np.random.SeedSequence(params['seed'], spawn_key=(params['replication'],))
+
+    _, queue_lengths, waits, still_waiting = run_sim(
+        weeks=params['duration_years'] * 52,
+        capacity=params['clinicians'] * params['patients_per_clinician_per_week'],
+        mean_arrivals=params['patients'],
+        sigma=params['patients'] * params['arrival_spread'],
+        seed=seed,
+        initial=params['initial_waitlist']
+    )
+    return {
+        **params,
+        'final_waiting_list': len(still_waiting),
+        'patients_seen': len(waits),
+        'average_wait_weeks': waits.mean() if len(waits) else 0.0
+    }
+
+
+def sweep_params(base, sweep, replications=1):
+    """Expand the list-valued entries of `sweep` into one parameter set per combination.
+
+    Anything not given in `sweep` falls back to `base`. Each combination is
+    repeated `replications` times, and replication r of every combination gets
+    the r-th child of SeedSequence(seed), so runs are independent but reproducible.
+    """
+    params = {**base, **sweep}
+    swept = [key for key, value in params.items() if isinstance(value, list)]
+
+    for values in itertools.product(*(params[key] for key in swept)):
+        for replication in range(replications):
+            yield {**params, **dict(zip(swept, values)), 'replication': replication}
+
+
+def run_sweep(param_sets, max_workers=None):
+    """Run each parameter set in its own process and collect the summaries in a DataFrame."""
+    param_sets = list(param_sets)
+    max_workers = max_workers or os.cpu_count()
+
+    # Each run is quick, so hand workers several at a time to keep IPC overhead down
+    chunksize = max(1, len(param_sets) // (4 * max_workers))
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(run_one, param_sets, chunksize=chunksize))
+
+    if not results:
+        return pd.DataFrame()
+
+    # Build column by column - every summary has the same keys, so this skips
+    # pandas inferring the columns from a list of row dicts
+    return pd.DataFrame({key: np.array([result[key] for result in results]) for key in results[0]})
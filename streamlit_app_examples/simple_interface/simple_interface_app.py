@@ -1,10 +1,187 @@
 import streamlit as st
-import simpy
-import random
-import math
-import matplotlib.pyplot as plt
+import hashlib
+import sys
+from pathlib import Path
+import numpy as np
+from matplotlib.figure import Figure
 import pandas as pd
 
+# The simulation itself lives in sim_core.py at the top of the repository
+sys.path.append(str(Path(__file__).resolve().parents[2]))
+import sim_core
+
+# The cache key only covers the wrapper below and its arguments, so fingerprint
+# sim_core.py too - editing the model then misses the (disk) cache instead of
+# serving results from the old code
+SIM_CORE_VERSION = hashlib.sha256(Path(sim_core.__file__).read_bytes()).hexdigest()
+
+@st.cache_data(show_spinner=False, persist="disk", max_entries=256)
+def run_sim(weeks, capacity, mean_arrivals, sigma, seed, initial, model_version):
+    """Cached wrapper around sim_core.run_sim - rerunning with the same inputs skips the simulation.
+
+    Results are plain NumPy arrays, so they're also pickled to disk and survive a server restart.
+    `model_version` isn't used here; it's only part of the cache key.
+    """
+    return sim_core.run_sim(weeks, capacity, mean_arrivals, sigma, seed, initial)
+
+def get_histogram_figure(name):
+    """Create a wait time histogram figure once per session and name, and reuse it on every rerun.
+
+    Kept in session state rather than a shared cache - matplotlib isn't thread-safe,
+    and each session's script runs in its own thread.
+    """
+    key = f'hist_{name}'
+    if key not in st.session_state:
+        # Plain Figure with a fixed axes rectangle, so redraws skip pyplot's figure
+        # manager and don't run a layout solver
+        fig = Figure(figsize=(10, 3))
+        ax = fig.add_axes([0.07, 0.17, 0.91, 0.71])
+        st.session_state[key] = (fig, ax)
+    return st.session_state[key]
+
+@st.fragment
+def render_results(sim_result, horizon):
+    """Draw the plots and metrics for one simulation result.
+
+    Runs as a fragment, so changing the widgets in here only redraws the results.
+    """
+    time_points, queue_lengths, waiting_times, still_waiting = sim_result
+
+    # Line chart is drawn in the browser - no point sending more than ~2 points per pixel
+    weeks_ds, queue_ds = sim_core.downsample_lttb(time_points, queue_lengths, n_out=2000)
+    st.write("**Waiting List Length Over Time**")
+    st.line_chart(
+        pd.DataFrame({'Waiting List Length': queue_ds}, index=weeks_ds),
+        x_label='Time (weeks)',
+        y_label='Waiting List Length',
+        color='#1f77b4'
+    )
+
+    # Metric cards
+    final_waiting_list = len(still_waiting)
+    col2a, col2b, col2c = st.columns(3)
+
+    with col2a:
+        st.metric(
+            label="Final Waiting List",
+            value=final_waiting_list,
+            help="Number of patients still waiting after simulation"
+        )
+
+    with col2b:
+        st.metric(
+            label="Patients Seen",
+            value=len(waiting_times),
+            help="Total number of patients who received treatment"
+        )
+
+    with col2c:
+        avg_wait = waiting_times.mean() if len(waiting_times) else 0
+        st.metric(
+            label="Average Wait (weeks)",
+            value=f"{avg_wait:.1f}",
+            help="Average waiting time for patients who were seen"
+        )
+
+    # Wait time breakdown
+    st.subheader("Wait Time Analysis")
+
+    # Thresholds live inside the fragment, so moving them never reruns the simulation
+    col_t1, col_t2, col_t3 = st.columns(3)
+    thresholds = [
+        col_t1.slider("First threshold (weeks)", min_value=1, max_value=104, value=18),
+        col_t2.slider("Second threshold (weeks)", min_value=1, max_value=104, value=36),
+        col_t3.slider("Third threshold (weeks)", min_value=1, max_value=104, value=52)
+    ]
+    threshold_colours = ['red', 'orange', 'darkred']
+
+    # Current wait times for patients still in queue
+    current_wait_times = horizon - still_waiting
+
+    # Both histograms share one set of bin edges, so their x-axes line up
+    hist_edges = np.histogram_bin_edges(np.concatenate([waiting_times, current_wait_times]), bins=20)
+
+    if len(waiting_times):
+        # Sort once, then count every wait time category with a binary search
+        sorted_waits = np.sort(waiting_times)
+        over_threshold = len(sorted_waits) - np.searchsorted(sorted_waits, thresholds, side='right')
+
+        st.write("**Patients Who Were Seen:**")
+        # Display breakdown in columns
+        for col, threshold, count in zip(st.columns(3), thresholds, over_threshold):
+            with col:
+                st.metric(
+                    label=f"Waited > {threshold} weeks",
+                    value=count,
+                    delta=f"{(count/len(waiting_times)*100):.1f}%"
+                )
+
+        # Optional: Show distribution histogram
+        fig2, ax2 = get_histogram_figure('seen')
+        ax2.clear()
+        counts, _ = np.histogram(sorted_waits, bins=hist_edges)
+        ax2.bar(hist_edges[:-1], counts, width=np.diff(hist_edges), align='edge', alpha=0.7, color='#ff7f0e')
+        for threshold, colour in zip(thresholds, threshold_colours):
+            ax2.axvline(x=threshold, color=colour, linestyle='--', alpha=0.7, label=f'{threshold} weeks')
+        ax2.set_xlabel('Wait Time (weeks)')
+        ax2.set_ylabel('Number of Patients')
+        ax2.set_title('Distribution of Wait Times - Patients Who Were Seen')
+        ax2.legend()
+        ax2.grid(True, alpha=0.3)
+        st.pyplot(fig2, clear_figure=False)
+    else:
+        st.warning("No patients were seen during the simulation period.")
+
+    # Analysis for patients still waiting
+    st.subheader("Patients Still Waiting")
+
+    if len(still_waiting):
+        # Calculate wait time categories for still waiting patients
+        waiting_over_threshold = [int((current_wait_times > threshold).sum()) for threshold in thresholds]
+
+        st.write("**Patients Still in Queue:**")
+        for col, threshold, count in zip(st.columns(3), thresholds, waiting_over_threshold):
+            with col:
+                st.metric(
+                    label=f"Waiting > {threshold} weeks",
+                    value=count,
+                    delta=f"{(count/len(still_waiting)*100):.1f}%"
+                )
+
+        # Additional metrics for still waiting patients
+        avg_current_wait = current_wait_times.mean()
+        max_current_wait = current_wait_times.max()
+
+        col5a, col5b = st.columns(2)
+        with col5a:
+            st.metric(
+                label="Average Current Wait",
+                value=f"{avg_current_wait:.1f} weeks",
+                help="Average wait time for patients still in queue"
+            )
+        with col5b:
+            st.metric(
+                label="Longest Current Wait",
+                value=f"{max_current_wait:.1f} weeks",
+                help="Longest wait time among patients still in queue"
+            )
+
+        # Show distribution histogram for patients still waiting
+        fig3, ax3 = get_histogram_figure('still_waiting')
+        ax3.clear()
+        counts, _ = np.histogram(current_wait_times, bins=hist_edges)
+        ax3.bar(hist_edges[:-1], counts, width=np.diff(hist_edges), align='edge', alpha=0.7, color='#d62728')
+        for threshold, colour in zip(thresholds, threshold_colours):
+            ax3.axvline(x=threshold, color=colour, linestyle='--', alpha=0.7, label=f'{threshold} weeks')
+        ax3.set_xlabel('Current Wait Time (weeks)')
+        ax3.set_ylabel('Number of Patients')
+        ax3.set_title('Distribution of Current Wait Times - Patients Still Waiting')
+        ax3.legend()
+        ax3.grid(True, alpha=0.3)
+        st.pyplot(fig3, clear_figure=False)
+    else:
+        st.success("No patients are currently waiting - all patients have been seen!")
+
 # Set page config for wide layout
 st.set_page_config(layout="wide")
 
@@ -63,242 +240,19 @@ with col2:
     if run_simulation:
         st.header("Simulation Results")
 
-        # Initialize tracking variables
-        waiting_times = []
-        queue_lengths = []
-        time_points = []
-        patients_seen = []
-        all_patients = []  # Track all patients including those still waiting
-
-        # Set random seed for reproducibility
-        random.seed(42)
-
-        def patient(env, name, nurses, arrival_time):
-            """A patient arrives, requests a clinician, is seen, and then leaves."""
-            service_time = 1 / patients_per_clinician_per_week
-
-            # Record patient in all_patients when they arrive
-            patient_record = {
-                'name': name,
-                'arrival_time': arrival_time,
-                'service_start': None,
-                'wait_time_weeks': None,
-                'status': 'waiting'
-            }
-            all_patients.append(patient_record)
-
-            with nurses.request() as request:
-                yield request
-                wait_time = env.now - arrival_time
-                waiting_times.append(wait_time)
-
-                # Update patient record when seen
-                patient_record['service_start'] = env.now
-                patient_record['wait_time_weeks'] = wait_time
-                patient_record['status'] = 'seen'
-
-                patients_seen.append(patient_record.copy())
-                yield env.timeout(service_time)
-
-        def patient_generator(env, nurses):
-            """Generates new patients based on a weekly schedule."""
-            # Create initial patients on waiting list
-            for i in range(waiting_list_start_length):
-                env.process(patient(env, f"Initial Patient {i+1}", nurses, 0))
-
-            # Generate new patients each week
-            while True:
-                num_arrivals = math.ceil(random.normalvariate(patients, patients*0.1))
-                num_arrivals = max(0, num_arrivals)
-
-                for i in range(num_arrivals):
-                    env.process(patient(env, f"Week {math.ceil(env.now)} Patient {i+1}",
-                                      nurses, env.now))
-
-                yield env.timeout(1)
-
-        def monitor_queue(env, nurses):
-            """Monitor queue length over time."""
-            while True:
-                queue_lengths.append(len(nurses.queue))
-                time_points.append(env.now)
-                yield env.timeout(1)  # Check every week
-
         # Run simulation
-        env = simpy.Environment()
-        nurses_resource = simpy.Resource(env, capacity=clinicians)
-
-        # Start processes
-        env.process(patient_generator(env, nurses_resource))
-        env.process(monitor_queue(env, nurses_resource))
-
-        # Run simulation
-        env.run(until=sim_duration_years*52)
-
-        # Create the matplotlib graph
-        fig, ax = plt.subplots(figsize=(10, 4))
-        ax.plot(time_points, queue_lengths, linewidth=2, color='#1f77b4')
-        ax.set_xlabel('Time (weeks)')
-        ax.set_ylabel('Waiting List Length')
-        ax.set_title('Waiting List Length Over Time')
-        ax.grid(True, alpha=0.3)
-        st.pyplot(fig)
-
-        # Metric cards
-        final_waiting_list = len(nurses_resource.queue)
-        col2a, col2b, col2c = st.columns(3)
-
-        with col2a:
-            st.metric(
-                label="Final Waiting List",
-                value=final_waiting_list,
-                help="Number of patients still waiting after simulation"
+        with st.spinner("Running simulation..."):
+            sim_result = run_sim(
+                weeks=sim_duration_years*52,
+                capacity=clinicians*patients_per_clinician_per_week,
+                mean_arrivals=patients,
+                sigma=patients*0.1,
+                seed=42,
+                initial=waiting_list_start_length,
+                model_version=SIM_CORE_VERSION
             )
 
-        with col2b:
-            st.metric(
-                label="Patients Seen",
-                value=len(patients_seen),
-                help="Total number of patients who received treatment"
-            )
-
-        with col2c:
-            avg_wait = sum(waiting_times) / len(waiting_times) if waiting_times else 0
-            st.metric(
-                label="Average Wait (weeks)",
-                value=f"{avg_wait:.1f}",
-                help="Average waiting time for patients who were seen"
-            )
-
-        # Wait time breakdown
-        st.subheader("Wait Time Analysis")
-
-        if patients_seen:
-            # Convert to DataFrame for easier analysis
-            df_patients = pd.DataFrame(patients_seen)
-
-            # Calculate wait time categories
-            over_18_weeks = len(df_patients[df_patients['wait_time_weeks'] > 18])
-            over_36_weeks = len(df_patients[df_patients['wait_time_weeks'] > 36])
-            over_52_weeks = len(df_patients[df_patients['wait_time_weeks'] > 52])
-
-            st.write("**Patients Who Were Seen:**")
-            # Display breakdown in columns
-            col3a, col3b, col3c = st.columns(3)
-
-            with col3a:
-                st.metric(
-                    label="Waited > 18 weeks",
-                    value=over_18_weeks,
-                    delta=f"{(over_18_weeks/len(patients_seen)*100):.1f}%"
-                )
-
-            with col3b:
-                st.metric(
-                    label="Waited > 36 weeks",
-                    value=over_36_weeks,
-                    delta=f"{(over_36_weeks/len(patients_seen)*100):.1f}%"
-                )
-
-            with col3c:
-                st.metric(
-                    label="Waited > 52 weeks",
-                    value=over_52_weeks,
-                    delta=f"{(over_52_weeks/len(patients_seen)*100):.1f}%"
-                )
-
-            # Optional: Show distribution histogram
-            fig2, ax2 = plt.subplots(figsize=(10, 3))
-            ax2.hist(df_patients['wait_time_weeks'], bins=20, alpha=0.7, color='#ff7f0e')
-            ax2.axvline(x=18, color='red', linestyle='--', alpha=0.7, label='18 weeks')
-            ax2.axvline(x=36, color='orange', linestyle='--', alpha=0.7, label='36 weeks')
-            ax2.axvline(x=52, color='darkred', linestyle='--', alpha=0.7, label='52 weeks')
-            ax2.set_xlabel('Wait Time (weeks)')
-            ax2.set_ylabel('Number of Patients')
-            ax2.set_title('Distribution of Wait Times - Patients Who Were Seen')
-            ax2.legend()
-            ax2.grid(True, alpha=0.3)
-            st.pyplot(fig2)
-        else:
-            st.warning("No patients were seen during the simulation period.")
-
-        # Analysis for patients still waiting
-        st.subheader("Patients Still Waiting")
-
-        # Calculate current wait times for patients still in queue
-        patients_still_waiting = [p for p in all_patients if p['status'] == 'waiting']
-
-        if patients_still_waiting:
-            # Calculate current wait times
-            current_wait_times = []
-            for patient in patients_still_waiting:
-                current_wait = (sim_duration_years*52) - patient['arrival_time']
-                patient['current_wait_weeks'] = current_wait
-                current_wait_times.append(current_wait)
-
-            df_waiting = pd.DataFrame(patients_still_waiting)
-
-            # Calculate wait time categories for still waiting patients
-            waiting_over_18 = len(df_waiting[df_waiting['current_wait_weeks'] > 18])
-            waiting_over_36 = len(df_waiting[df_waiting['current_wait_weeks'] > 36])
-            waiting_over_52 = len(df_waiting[df_waiting['current_wait_weeks'] > 52])
-
-            st.write("**Patients Still in Queue:**")
-            col4a, col4b, col4c = st.columns(3)
-
-            with col4a:
-                st.metric(
-                    label="Waiting > 18 weeks",
-                    value=waiting_over_18,
-                    delta=f"{(waiting_over_18/len(patients_still_waiting)*100):.1f}%"
-                )
-
-            with col4b:
-                st.metric(
-                    label="Waiting > 36 weeks",
-                    value=waiting_over_36,
-                    delta=f"{(waiting_over_36/len(patients_still_waiting)*100):.1f}%"
-                )
-
-            with col4c:
-                st.metric(
-                    label="Waiting > 52 weeks",
-                    value=waiting_over_52,
-                    delta=f"{(waiting_over_52/len(patients_still_waiting)*100):.1f}%"
-                )
-
-            # Additional metrics for still waiting patients
-            avg_current_wait = sum(current_wait_times) / len(current_wait_times)
-            max_current_wait = max(current_wait_times)
-
-            col5a, col5b = st.columns(2)
-            with col5a:
-                st.metric(
-                    label="Average Current Wait",
-                    value=f"{avg_current_wait:.1f} weeks",
-                    help="Average wait time for patients still in queue"
-                )
-            with col5b:
-                st.metric(
-                    label="Longest Current Wait",
-                    value=f"{max_current_wait:.1f} weeks",
-                    help="Longest wait time among patients still in queue"
-                )
-
-            # Show distribution histogram for patients still waiting
-            fig3, ax3 = plt.subplots(figsize=(10, 3))
-            ax3.hist(current_wait_times, bins=20, alpha=0.7, color='#d62728')
-            ax3.axvline(x=18, color='red', linestyle='--', alpha=0.7, label='18 weeks')
-            ax3.axvline(x=36, color='orange', linestyle='--', alpha=0.7, label='36 weeks')
-            ax3.axvline(x=52, color='darkred', linestyle='--', alpha=0.7, label='52 weeks')
-            ax3.set_xlabel('Current Wait Time (weeks)')
-            ax3.set_ylabel('Number of Patients')
-            ax3.set_title('Distribution of Current Wait Times - Patients Still Waiting')
-            ax3.legend()
-            ax3.grid(True, alpha=0.3)
-            st.pyplot(fig3)
-        else:
-            st.success("No patients are currently waiting - all patients have been seen!")
+        render_results(sim_result, horizon=sim_duration_years*52)
 
     else:
         st.info("👈 Configure your simulation parameters and click 'Run Simulation' to see results")